@@ -1,9 +1,15 @@
 import logging.handlers
 import uuid
 import csv
-from typing import List
+from typing import List, Tuple, Sequence
 import hashlib
-from functools import reduce
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class Logger(logging.Logger):
@@ -75,8 +81,7 @@ def int2bytes(val: int) -> bytes:
 
 
 def int_list_to_bytes(int_list: List[int]) -> bytes:
-    bytes_list = [int2bytes(i) for i in int_list]
-    return reduce(lambda x, y: x + y, bytes_list)
+    return b"".join(int2bytes(i) for i in int_list)
 
 
 def bytes2int(val: bytes) -> int:
@@ -95,3 +100,93 @@ def bytes_to_int_list(_bytes: bytes) -> List[int]:
     for item in temp_bytes_list:
         int_list.append(bytes2int(item))
     return int_list
+
+
+def get_missing_ranges(received: Sequence) -> List[Tuple[int, int]]:
+    """
+    find the ranges of seq which have not been received
+    :param received: received[i] is True if the seq i has been received
+    :return: list of (from_seq, to_seq), both ends included
+    """
+    ranges = []
+    start = None
+    for seq, flag in enumerate(received):
+        if not flag and start is None:
+            start = seq
+        elif flag and start is not None:
+            ranges.append((start, seq - 1))
+            start = None
+    if start is not None:
+        ranges.append((start, len(received) - 1))
+    return ranges
+
+
+def ranges_to_str(ranges: List[Tuple[int, int]]) -> str:
+    """
+        e.g. [(3, 5), (9, 9)] -> "3-5,9"
+    """
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+"""
+    Typecodes of array for the numeric dtypes, the dtype is in numpy style, e.g. '<f8' means
+little-endian 8 bytes float, '>i4' means big-endian 4 bytes signed int.
+"""
+_ARRAY_TYPECODES = {'i4': 'i', 'i8': 'q', 'f8': 'd'}
+_NATIVE_BYTEORDER = '<' if sys.byteorder == 'little' else '>'
+
+
+def _get_array_typecode(dtype: str) -> str:
+    if dtype[0] not in '<>' or dtype[1:] not in _ARRAY_TYPECODES:
+        raise ValueError(f"Unsupported dtype {dtype}")
+    return _ARRAY_TYPECODES[dtype[1:]]
+
+
+def bytes_to_typed_array(_bytes: bytes, dtype: str, use_numpy: bool = False):
+    """
+        Decode the bytes as a whole instead of item by item. There's no byte swapping if the
+    byte order of dtype is the native one.
+    :param _bytes:
+    :param dtype: numpy style dtype, e.g. '<f8'
+    :param use_numpy: return a read-only numpy view of the bytes rather than array
+    :return:    array       if use_numpy=False
+                ndarray     if use_numpy=True
+    """
+    typecode = _get_array_typecode(dtype)
+    item_size = int(dtype[2:])
+    if len(_bytes) % item_size != 0:
+        raise ValueError(f"length of bytes must be {item_size} times")
+    if use_numpy:
+        if numpy is None:
+            raise ImportError("numpy is required to decode bytes into ndarray")
+        return numpy.frombuffer(_bytes, dtype=dtype)
+    result = array(typecode)
+    result.frombytes(_bytes)
+    if dtype[0] != _NATIVE_BYTEORDER:
+        result.byteswap()
+    return result
+
+
+def new_typed_array(dtype: str, length: int) -> array:
+    """
+        Array of zeros in the native byte order, the byte order of dtype is ignored.
+    """
+    typecode = _get_array_typecode(dtype)
+    return array(typecode, bytes(length * array(typecode).itemsize))
+
+
+def typed_list_to_bytes(values, dtype: str) -> bytes:
+    """
+    :param values: list, array or ndarray of numbers
+    :param dtype: numpy style dtype, e.g. '<f8'
+    :return:
+    """
+    typecode = _get_array_typecode(dtype)
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.astype(dtype, copy=False).tobytes()
+    if isinstance(values, array) and values.typecode == typecode and dtype[0] == _NATIVE_BYTEORDER:
+        return values.tobytes()
+    result = array(typecode, values)
+    if dtype[0] != _NATIVE_BYTEORDER:
+        result.byteswap()
+    return result.tobytes()
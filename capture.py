@@ -0,0 +1,171 @@
+from enum import Enum
+from threading import Lock
+from typing import Iterator
+import struct
+import time
+from package import Header, PackageDataType
+from app.utils import Logger
+
+log = Logger()
+
+
+class TraceDirection(Enum):
+    RECEIVED = 0
+    SENT = 1
+
+
+class TraceMetadata:
+    """
+    ---------------------------------------------------------------
+    | 0                      4B             8B                  9B |
+    |          4B             |      4B      |         1B          |
+    |  target seq data num    |  max buffer  |  package data type  |
+    ---------------------------------------------------------------
+
+        Parameters of the captured job, written right after the magic, so the job could be replayed
+    with the same parameters.
+    package data type   :       The data type the proxy was configured with, b'\xff' for none, namely the
+                            data type was taken from the first received package.
+    """
+    METADATA_STRUCT = struct.Struct('>IIc')
+    NONE_DATA_TYPE = b'\xff'
+
+    def __init__(self, target_seq_data_num: int, max_buffer: int, data_type: PackageDataType = None):
+        self.target_seq_data_num = target_seq_data_num
+        self.max_buffer = max_buffer
+        self.data_type = data_type
+
+    def to_bytes(self) -> bytes:
+        data_type = self.data_type.value if self.data_type is not None else self.NONE_DATA_TYPE
+        return self.METADATA_STRUCT.pack(self.target_seq_data_num, self.max_buffer, data_type)
+
+    @staticmethod
+    def load_from_bytes(data: bytes):
+        target_seq_data_num, max_buffer, data_type = TraceMetadata.METADATA_STRUCT.unpack(data)
+        if data_type == TraceMetadata.NONE_DATA_TYPE:
+            data_type = None
+        else:
+            data_type = PackageDataType.get_type_by_value(data_type)
+        return TraceMetadata(target_seq_data_num, max_buffer, data_type)
+
+
+class TraceRecord:
+    """
+    ---------------------------------------------------------------------------------------------------
+    | 0          8B          9B          17B                19B              23B        ...          |
+    |     8B      |    1B     |     8B     |       2B         |       4B       |  header  |  payload  |
+    |  timestamp  | direction | client id  | length of header | length of pay- |          |           |
+    |             |           |            |                  |      load      |          |           |
+    ---------------------------------------------------------------------------------------------------
+
+        A frame received from or sent to a peer, the trace file is the magic, the metadata, then records.
+    timestamp           :       Seconds since the epoch, float64, big-endian.
+    client id           :       The uuid of client, or "server" for the upstream server, padded with zeros.
+    length of header    :       Header is stored without the trailing zeros, which are mostly the padding
+                            of the message string, and is padded back to Header.HEADER_LEN when loaded.
+    """
+    MAGIC = b'ACTFTRC\x01'
+    RECORD_STRUCT = struct.Struct('>dB8sHI')
+    CLIENT_ID_LEN = 8
+    SERVER_CLIENT_ID = "server"
+
+    def __init__(self, timestamp: float, direction: TraceDirection, client_id: str,
+                 header_data: bytes, payload: bytes = b''):
+        self.timestamp = timestamp
+        self.direction = direction
+        self.client_id = client_id
+        self.header_data = header_data
+        self.payload = payload
+
+    def get_header(self) -> Header:
+        header = Header()
+        header.load_from_header_data(self.header_data)
+        return header
+
+    def get_frame_data(self) -> bytes:
+        return self.header_data + self.payload
+
+    def to_bytes(self) -> bytes:
+        client_id: bytes = self.client_id.encode()
+        if len(client_id) > self.CLIENT_ID_LEN:
+            raise TraceFormatError(f"Client id {self.client_id} is longer than {self.CLIENT_ID_LEN} bytes")
+        header_data = self.header_data.rstrip(b'\x00')
+        return self.RECORD_STRUCT.pack(self.timestamp, self.direction.value, client_id,
+                                       len(header_data), len(self.payload)) + header_data + self.payload
+
+
+class TraceWriter:
+    """
+        Write the frames into a binary trace file, thread safe, for the frames are captured by the
+    receiving threads of all the clients. Each record is flushed, so the trace of an interrupted
+    job is kept.
+    """
+
+    def __init__(self, filename: str, metadata: TraceMetadata):
+        self.filename = filename
+        self.metadata = metadata
+        self.__file = open(filename, 'wb')
+        self.__file.write(TraceRecord.MAGIC + metadata.to_bytes())
+        self.__file.flush()
+        self.__lock = Lock()
+
+    def record(self, direction: TraceDirection, client_id: str, header_data: bytes, payload: bytes = b''):
+        data = TraceRecord(time.time(), direction, client_id, header_data, payload).to_bytes()
+        self.__lock.acquire()
+        try:
+            if not self.__file.closed:
+                self.__file.write(data)
+                self.__file.flush()
+        finally:
+            self.__lock.release()
+
+    def close(self):
+        self.__lock.acquire()
+        try:
+            self.__file.close()
+        finally:
+            self.__lock.release()
+
+
+class TraceReader:
+    """
+        The last record might be truncated if the capture was interrupted, the records before it
+    are still read.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(self.filename, 'rb') as f:
+            if f.read(len(TraceRecord.MAGIC)) != TraceRecord.MAGIC:
+                raise TraceFormatError(f"{self.filename} is not a trace file")
+            metadata_data = f.read(TraceMetadata.METADATA_STRUCT.size)
+        if len(metadata_data) != TraceMetadata.METADATA_STRUCT.size:
+            raise TraceFormatError(f"The metadata of {self.filename} is truncated")
+        self.metadata: TraceMetadata = TraceMetadata.load_from_bytes(metadata_data)
+
+    def __iter__(self) -> Iterator[TraceRecord]:
+        with open(self.filename, 'rb') as f:
+            f.seek(len(TraceRecord.MAGIC) + TraceMetadata.METADATA_STRUCT.size)
+            while True:
+                record_data = f.read(TraceRecord.RECORD_STRUCT.size)
+                if not record_data:
+                    break
+                if len(record_data) != TraceRecord.RECORD_STRUCT.size:
+                    log.warning(f"The last record of {self.filename} is truncated, ignored")
+                    break
+                timestamp, direction, client_id, header_len, payload_len = \
+                    TraceRecord.RECORD_STRUCT.unpack(record_data)
+                header_data = f.read(header_len)
+                payload = f.read(payload_len)
+                if len(header_data) != header_len or len(payload) != payload_len:
+                    log.warning(f"The last record of {self.filename} is truncated, ignored")
+                    break
+                yield TraceRecord(timestamp=timestamp,
+                                  direction=TraceDirection(direction),
+                                  client_id=client_id.rstrip(b'\x00').decode(),
+                                  header_data=header_data.ljust(Header.HEADER_LEN, b'\x00'),
+                                  payload=payload)
+
+
+class TraceFormatError(ValueError):
+    pass
@@ -1,10 +1,17 @@
 from proxy import Proxy
 import socket
+import argparse
+from capture import TraceWriter, TraceMetadata
 from app.utils import Logger
 
 log = Logger()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--capture', metavar='TRACE_FILE', default=None,
+                        help='capture the traffic into the trace file, which could be replayed by replay.py')
+    args = parser.parse_args()
+
     s = socket.socket()
     host = socket.gethostname()
     port = 23456
@@ -17,4 +24,9 @@ if __name__ == '__main__':
         / ___ |/ /___   / /  / __/    / ____// _, _// /_/ //   |   / /  
        /_/  |_|\____/  /_/  /_/      /_/    /_/ |_| \____//_/|_|  /_/   
     """)
-    proxy = Proxy(socket=s, target_seq_data_num=30, max_buffer=5)
+    target_seq_data_num, max_buffer = 30, 5
+    trace = None
+    if args.capture is not None:
+        trace = TraceWriter(args.capture, TraceMetadata(target_seq_data_num=target_seq_data_num,
+                                                        max_buffer=max_buffer))
+    proxy = Proxy(socket=s, target_seq_data_num=target_seq_data_num, max_buffer=max_buffer, trace=trace)
@@ -1,7 +1,7 @@
 from socket import socket as Socket
 from enum import Enum
 import hashlib
-from app.utils import bytes_to_int_list, int2bytes, bytes2int
+from app.utils import bytes_to_int_list, int2bytes, bytes2int, bytes_to_typed_array
 
 
 class PackageDataType(Enum):
@@ -9,6 +9,12 @@ class PackageDataType(Enum):
     # size of int must be 8 bytes, signed
     INT = b'\x01'
     UTF8_STR = b'\x02'
+    # numeric arrays, the payload is a sequence of items of the same size and byte order
+    INT32 = b'\x03'
+    FLOAT64 = b'\x04'
+    INT32_LE = b'\x05'
+    INT64_LE = b'\x06'
+    FLOAT64_LE = b'\x07'
 
     @staticmethod
     def get_type_by_value(value: bytes) -> Enum:
@@ -31,6 +37,31 @@ class PackageDataType(Enum):
             return "integer"
         if _type == PackageDataType.UTF8_STR:
             return "string"
+        if _type == PackageDataType.INT32:
+            return "int32"
+        if _type == PackageDataType.FLOAT64:
+            return "float64"
+        if _type == PackageDataType.INT32_LE:
+            return "int32 little-endian"
+        if _type == PackageDataType.INT64_LE:
+            return "integer little-endian"
+        if _type == PackageDataType.FLOAT64_LE:
+            return "float64 little-endian"
+
+    @staticmethod
+    def get_dtype(value):
+        """
+            The numpy style dtype of the numeric types, e.g. '<f8' for FLOAT64_LE.
+        :return:    None if the type is not numeric
+        """
+        return {
+            PackageDataType.INT: '>i8',
+            PackageDataType.INT32: '>i4',
+            PackageDataType.FLOAT64: '>f8',
+            PackageDataType.INT32_LE: '<i4',
+            PackageDataType.INT64_LE: '<i8',
+            PackageDataType.FLOAT64_LE: '<f8',
+        }.get(value)
 
 
 class Header:
@@ -63,6 +94,9 @@ class Header:
 
     MSG_PACKAGE_DISCARD = "Package has been discarded"
     MSG_ACKNOWLEDGED = "Acknowledged"
+    MSG_UNSUPPORTED_DATA_TYPE = "Unsupported package data type"
+    # followed by the missing seq ranges, e.g. "Request seq range: 3-5,9"
+    MSG_REQUEST_SEQ_RANGE = "Request seq range"
 
     def __init__(self,
                  package_len: bytes = b'\x00' * HEADER_PACKAGE_LEN_LEN,
@@ -233,18 +267,27 @@ class Package:
     def get_header(self):
         return self.__header
 
-    def get_payload(self, parse=False):
+    def get_data_type(self) -> PackageDataType:
+        return self.__data_type
+
+    def get_payload(self, parse=False, use_numpy=False):
         """
         :param parse:
+        :param use_numpy:   decode the numeric payload into a read-only numpy view
         :return:
                 bytes       if the parse=False
                 List[int]   if the datatype of payload is int
+                array       if the datatype of payload is other numeric type
+                ndarray     if the datatype of payload is numeric and use_numpy=True
         """
 
         if not parse:
             return self.__payload
-        if self.__data_type == PackageDataType.INT:
+        if self.__data_type == PackageDataType.INT and not use_numpy:
             return bytes_to_int_list(self.__payload)
+        dtype = PackageDataType.get_dtype(self.__data_type)
+        if dtype is not None:
+            return bytes_to_typed_array(self.__payload, dtype, use_numpy=use_numpy)
 
     def generate_default_header(self, msg: str = None):
         header = Header()
@@ -295,16 +338,31 @@ def send_package(package: Package, sock: Socket):
         raise HasNoHeaderException()
     payload = package.get_payload()
 
-    sock.send(header.get_header_data())
-    sock.send(payload)
+    sock.sendall(header.get_header_data())
+    sock.sendall(payload)
 
 
-def send_message(message: str, sock: Socket, ack: bytes = None):
+def send_message(message: str, sock: Socket, ack: bytes = None) -> Header:
     header = Header()
     header.set_message(message)
     if ack is not None:
         header.set_ack(ack)
-    sock.send(header.get_header_data())
+    sock.sendall(header.get_header_data())
+    return header
+
+
+def receive_exactly(sock: Socket, size: int) -> bytes:
+    """
+        The recv may return less data than size if the data is sent in several segments,
+    so receive until the size of data is reached.
+    """
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("Connection closed by peer")
+        data += chunk
+    return data
 
 
 def receive_package(sock: Socket):
@@ -316,14 +374,14 @@ def receive_package(sock: Socket):
                 Package object if the size of package is not zero,
             but there's still a header object in the package object.
     """
-    header_data = sock.recv(Header.HEADER_LEN)
+    header_data = receive_exactly(sock, Header.HEADER_LEN)
 
     header = Header()
     header.load_from_header_data(header_data)
 
     if not header.has_package():
         return header
-    payload = sock.recv(header.get_package_len(parse=True))
+    payload = receive_exactly(sock, header.get_package_len(parse=True))
     data_type = header.get_package_data_type(parse=True)
     package = Package(payload=payload, data_type=data_type, header=header)
     return package
@@ -1,9 +1,12 @@
-from threading import Thread, Lock
+from threading import Thread, Lock, Timer
 import socket
 from package import receive_package, Package, Header, PackageDataType, send_package, send_message
 from socket import socket as Socket
-from app.utils import Logger, generate_client_uuid, int_list_to_bytes
+from capture import TraceWriter, TraceDirection, TraceRecord
+from app.utils import Logger, generate_client_uuid, typed_list_to_bytes, get_missing_ranges, ranges_to_str, \
+    bytes_to_typed_array, new_typed_array
 from typing import List, Tuple
+from enum import Enum
 import queue
 import sqlite3
 
@@ -14,9 +17,18 @@ class Client:
     def __init__(self, uuid: str, socket: Socket):
         self.uuid = uuid
         self.socket = socket
+        """
+            The receiving thread of the client sends ACKs while the deadline timer sends the reassign
+        requests, so the headers must be sent one by one.
+        """
+        self.send_lock = Lock()
 
 
 class SeqData:
+    """
+        Seq data of a package, data is the array of continuous seq data which starts from seq.
+    """
+
     def __init__(self, seq: int, data):
         self.seq = seq
         self.data = data
@@ -28,6 +40,19 @@ class SeqData:
         return f"({self.seq},{self.data})"
 
 
+class DeadlinePolicy(Enum):
+    """
+        What the proxy does if the job deadline fires before all the seq data have been received.
+    PARTIAL     :   Send the received seq data to the server, one package for each range of continuous
+                seq, the header seq is the first seq of the range and the header message carries the
+                coverage report.
+    REASSIGN    :   Ask the connected clients to resend the missing seq ranges, then fall back to
+                PARTIAL if there're still missing seq data after the reassign timeout.
+    """
+    PARTIAL = 0
+    REASSIGN = 1
+
+
 class Proxy:
     """
         Suppose there're would be 8 ordered packages, namely when proxy had received 8 packages which
@@ -38,17 +63,57 @@ class Proxy:
     # TARGET_SEQ_DATA_NUM = 10
     # MAX_BUFFER = 10
 
-    def __init__(self, socket: Socket, target_seq_data_num: int, max_buffer: int = 10):
+    def __init__(self, socket: Socket, target_seq_data_num: int, max_buffer: int = 10,
+                 job_deadline: float = None, deadline_policy: DeadlinePolicy = DeadlinePolicy.PARTIAL,
+                 reassign_timeout: float = 5, data_type: PackageDataType = None,
+                 server_address: Tuple[str, int] = None, trace: TraceWriter = None,
+                 db_file: str = './data/result_data.db'):
         self.socket: Socket = socket
         self.client_list: List[Client] = []
 
         self.consuming_count: int = 0
+        """
+            Number of seq data in the received buffer, the buffer is limited by it rather than by the
+        number of packages.
+        """
+        self.buffered_count: int = 0
+        self.buffered_count_lock = Lock()
 
         self.job_finished_flag = False
         self.job_finished_flag_lock = Lock()
 
         self.target_seq_data_num: int = target_seq_data_num
 
+        """
+            Numeric data type of the seq data of this job, None for taking the type of the first
+        received package. Packages of other types will be rejected, so the seq data could be
+        stored and aggregated in one dtype without conversion.
+        """
+        self.data_type: PackageDataType = data_type
+        self.data_type_lock = Lock()
+
+        """
+            Address of the upstream server, None for port 23457 of this host.
+        """
+        self.server_address: Tuple[str, int] = server_address
+
+        """
+            If not None, every frame received from and sent to the clients and the server will be
+        captured into the trace file, which could be replayed by replay.py.
+        """
+        self.trace: TraceWriter = trace
+        self.db_file: str = db_file
+
+        """
+            Seconds from the first client connected to the deadline of the job, None for waiting forever.
+        So that a slow or dead client could not stall the whole job.
+        """
+        self.job_deadline: float = job_deadline
+        self.deadline_policy: DeadlinePolicy = deadline_policy
+        self.reassign_timeout: float = reassign_timeout
+        self.deadline_timer: Timer = None
+        self.reassigned_flag = False
+
         """
             The package received from clients will be placed into this buffer immediately, then 
         there will be another thread to handle the buffer to reorder the package by package seq.
@@ -56,18 +121,21 @@ class Proxy:
             Actually, the received_buffer and the ordered_packages is a producer-consumer model.
         The received buffer is a shared resources, the thread which receives packages from clients
         is producers, and the thread which retrieves data from the buffer is a consumer.
-            The item in queue is class SeqData
+            The item in queue is class SeqData, one for each package.
         """
         self.max_buffer = max_buffer
         self.received_buffer: queue.Queue = queue.Queue(maxsize=self.max_buffer)
         """
-            List of ordered packages, the size of this list is grater than received_buffer a lot.
-        This list could be stored in files or database orderly, then combine to one package or do some
+            Array of ordered seq data indexed by seq, in the data type of job and native byte order,
+        so the seq data of a package is stored by one slice assignment. It's allocated when the
+        first package is consumed, for the data type of job might be unknown before.
+            received_flags[seq] is 1 if the seq data has been received.
+            This array could be stored in files or database orderly, then combine to one package or do some
         calculation before sending to server.
             But for now, it's just stored in memory.
         """
-        self.ordered_seq_data: List[SeqData] = []
-        self.__init_ordered_packages()
+        self.ordered_data = None
+        self.received_flags = bytearray(self.target_seq_data_num)
 
         self.start_consume()
 
@@ -78,22 +146,21 @@ class Proxy:
             self.client_list.append(client)
             log.info(f"Node {addr} connected, uuid: {client.uuid}")
             log.debug(f"Total {len(self.client_list)} node(s)")
+            if self.job_deadline is not None and self.deadline_timer is None:
+                self.start_deadline_timer(self.job_deadline)
 
             self.start_receive_thread(client)
 
-    def __init_ordered_packages(self):
-        self.ordered_seq_data = [None for i in range(self.target_seq_data_num)]
-
     def start_consume(self):
         """
         :return:
         """
 
         def temp():
-            conn = sqlite3.connect('./data/result_data.db')
+            conn = sqlite3.connect(self.db_file)
             c = conn.cursor()
             c.execute("""
-                DROP TABLE seq_data
+                DROP TABLE IF EXISTS seq_data
             """)
             c.execute(
                 '''CREATE TABLE seq_data
@@ -112,17 +179,16 @@ class Proxy:
                 if not self.received_buffer.empty():
                     for i in range(buffer_length):
                         seq_data: SeqData = self.received_buffer.get()
+                        self.buffered_count_lock.acquire()
+                        self.buffered_count -= len(seq_data.data)
+                        self.buffered_count_lock.release()
                         log.debug(f"consume seq data {seq_data}")
-                        self.ordered_seq_data[seq_data.seq] = seq_data
-                        self.consuming_count += 1
+                        rows = self.store_seq_data(seq_data)
                         # time.sleep(1)
-                        c.execute(f'''
+                        c.executemany('''
                             INSERT INTO seq_data(seq,number)
-                            VALUES
-                            (
-                                {seq_data.seq},{seq_data.data}
-                            )
-                        ''')
+                            VALUES (?, ?)
+                        ''', rows)
                         conn.commit()
                         self.print_buffer()
 
@@ -145,44 +211,166 @@ class Proxy:
                     result = receive_package(client.socket)
                     if isinstance(result, Header):
                         header = result
+                        self.capture(TraceDirection.RECEIVED, client.uuid, header)
                         log.debug(f"<- message: \"{header.get_message()}\" "
                                   f"| hash: {header.get_package_hashcode()}")
                     else:
                         package = result
                         header = result.get_header()
+                        self.capture(TraceDirection.RECEIVED, client.uuid, header, package.get_payload())
                         log.debug(f"[{client.uuid}] -> " + package.get_desc())
                         # place the package into ordered list by the package seq
                         if not header.has_package_seq():
                             continue
                         seq = header.get_package_seq(parse=True)
-                        # suppose the payload is list of integer, ordered
-                        payload: List[int] = package.get_payload(parse=True)
+                        # ---> reject the package
+                        if not self.accept_data_type(package.get_data_type()):
+                            log.warning(f"The data type of received package is "
+                                        f"{PackageDataType.parse_to_str(package.get_data_type())}, "
+                                        f"which is not accepted by the job, the package will be rejected!")
+                            self.send_message_to_client(client, message=Header.MSG_UNSUPPORTED_DATA_TYPE,
+                                                        ack=header.get_package_hashcode())
+                            continue
+                        # <--- reject the package
+                        # the payload is array of numbers in the data type of job, ordered
+                        payload = bytes_to_typed_array(package.get_payload(), PackageDataType.get_dtype(self.data_type))
                         payload_length = len(payload)
 
-                        buffer_length = self.received_buffer.qsize()
+                        self.buffered_count_lock.acquire()
+                        buffer_length = self.buffered_count
+                        if payload_length + buffer_length <= self.max_buffer:
+                            self.buffered_count += payload_length
+                        self.buffered_count_lock.release()
                         # ---> discard the package
                         if payload_length + buffer_length > self.max_buffer:
                             log.warning(f"The buffer size is {buffer_length} of {self.max_buffer} now, "
                                         f"but received payload size is {payload_length}, "
                                         f"the package will be discarded!")
-                            send_message(message=Header.MSG_PACKAGE_DISCARD, ack=header.get_package_hashcode(),
-                                         sock=client.socket)
+                            self.send_message_to_client(client, message=Header.MSG_PACKAGE_DISCARD,
+                                                        ack=header.get_package_hashcode())
                             continue
                         # <--- discard the package
                         # ---> parse and handle the package
-                        for i in range(len(payload)):
-                            self.received_buffer.put(SeqData(seq=seq + i, data=payload[i]))
-                        send_message(message=Header.MSG_ACKNOWLEDGED, ack=header.get_package_hashcode(),
-                                     sock=client.socket)
+                        self.received_buffer.put(SeqData(seq=seq, data=payload))
+                        self.send_message_to_client(client, message=Header.MSG_ACKNOWLEDGED,
+                                                    ack=header.get_package_hashcode())
                         self.print_buffer()
                     # <--- parse and handle the package
-                except (ConnectionAbortedError, ConnectionResetError):
+                except OSError:
+                    # connection closed by the client, or by finish_job
                     break
 
         t = Thread(target=temp)
         client.thread = t
         t.start()
 
+    def store_seq_data(self, seq_data: SeqData) -> List[Tuple[int, object]]:
+        """
+            Place the seq data into the ordered array by seq, the seq data out of range or which has been
+        consumed will be ignored.
+        :return:    list of (seq, data) which have been stored
+        """
+        data = seq_data.data
+        from_seq = max(seq_data.seq, 0)
+        to_seq = min(seq_data.seq + len(data), self.target_seq_data_num)
+        if from_seq >= to_seq:
+            log.warning(f"seq data {seq_data} is out of range, ignored")
+            return []
+        if to_seq - from_seq != len(data):
+            log.warning(f"seq data {seq_data} is partly out of range, only {from_seq} to {to_seq - 1} is stored")
+            data = data[from_seq - seq_data.seq:to_seq - seq_data.seq]
+        if self.ordered_data is None:
+            self.ordered_data = new_typed_array(PackageDataType.get_dtype(self.data_type), self.target_seq_data_num)
+
+        if self.received_flags.count(1, from_seq, to_seq) == 0:
+            self.ordered_data[from_seq:to_seq] = data
+            self.received_flags[from_seq:to_seq] = b'\x01' * len(data)
+            self.consuming_count += len(data)
+            return list(zip(range(from_seq, to_seq), data))
+
+        # the missing seq data might be resent by more than one client after reassigned
+        rows = []
+        for seq, item in zip(range(from_seq, to_seq), data):
+            if self.received_flags[seq]:
+                log.debug(f"seq data ({seq},{item}) has been consumed, ignored")
+                continue
+            self.ordered_data[seq] = item
+            self.received_flags[seq] = 1
+            rows.append((seq, item))
+        self.consuming_count += len(rows)
+        return rows
+
+    def accept_data_type(self, data_type: PackageDataType) -> bool:
+        if PackageDataType.get_dtype(data_type) is None:
+            return False
+        self.data_type_lock.acquire()
+        if self.data_type is None:
+            self.data_type = data_type
+            log.info(f"The data type of job is {PackageDataType.parse_to_str(data_type)}")
+        self.data_type_lock.release()
+        return data_type == self.data_type
+
+    def start_deadline_timer(self, interval: float):
+        self.deadline_timer = Timer(interval, self.on_job_deadline)
+        self.deadline_timer.daemon = True
+        self.deadline_timer.start()
+
+    def get_missing_seq_ranges(self) -> List[Tuple[int, int]]:
+        return get_missing_ranges(self.received_flags)
+
+    def on_job_deadline(self):
+        if self.job_finished_flag:
+            return
+        missing_ranges = self.get_missing_seq_ranges()
+        log.warning(f"Job deadline reached, {self.consuming_count} of {self.target_seq_data_num} seq data "
+                    f"received, missing seq: {ranges_to_str(missing_ranges)}")
+        if self.deadline_policy == DeadlinePolicy.REASSIGN and not self.reassigned_flag:
+            self.reassigned_flag = True
+            self.request_missing_seq(missing_ranges)
+            self.start_deadline_timer(self.reassign_timeout)
+            return
+        self.job_finished_flag_lock.acquire()
+        self.job_finished_flag = True
+        self.job_finished_flag_lock.release()
+
+    def request_missing_seq(self, missing_ranges: List[Tuple[int, int]]):
+        """
+            Ask all the connected clients to resend the missing seq ranges, the clients which hold
+        the data will resend them as usual packages. The ranges are split into several messages if
+        they're too long for one header message.
+        """
+        prefix = f"{Header.MSG_REQUEST_SEQ_RANGE}: "
+        max_len = Header.HEADER_MESSAGE_LEN - len(prefix)
+        messages = []
+        ranges_str = ""
+        for item in ranges_to_str(missing_ranges).split(","):
+            if ranges_str and len(ranges_str) + 1 + len(item) > max_len:
+                messages.append(prefix + ranges_str)
+                ranges_str = ""
+            ranges_str = f"{ranges_str},{item}" if ranges_str else item
+        if ranges_str:
+            messages.append(prefix + ranges_str)
+
+        for client in self.client_list:
+            try:
+                for message in messages:
+                    self.send_message_to_client(client, message=message)
+                log.info(f"Request missing seq from {client.uuid}")
+            except OSError:
+                log.warning(f"Failed to request missing seq from {client.uuid}")
+
+    def send_message_to_client(self, client: Client, message: str, ack: bytes = None):
+        client.send_lock.acquire()
+        try:
+            header = send_message(message=message, sock=client.socket, ack=ack)
+        finally:
+            client.send_lock.release()
+        self.capture(TraceDirection.SENT, client.uuid, header)
+
+    def capture(self, direction: TraceDirection, client_id: str, header: Header, payload: bytes = b''):
+        if self.trace is not None:
+            self.trace.record(direction, client_id, header.get_header_data(), payload)
+
     def print_buffer(self):
         log.debug(f"the buffer data is:{list(self.received_buffer.queue)}")
 
@@ -192,7 +380,14 @@ class Proxy:
         :return:
         """
         self.job_finished_flag_lock.acquire()
-        log.info("The ordered packages has been full-filled, job is done.")
+        if self.deadline_timer is not None:
+            self.deadline_timer.cancel()
+        missing_ranges = self.get_missing_seq_ranges()
+        if missing_ranges:
+            log.warning(f"The ordered packages has not been full-filled, job is done with "
+                        f"{self.consuming_count} of {self.target_seq_data_num} seq data.")
+        else:
+            log.info("The ordered packages has been full-filled, job is done.")
         for client in self.client_list:
             client.socket.close()
             log.info(f"Close connection of {client.uuid}")
@@ -200,19 +395,52 @@ class Proxy:
         self.job_finished_flag_lock.release()
 
         s = socket.socket()
-        server_host = socket.gethostname()
-        server_port = 23457
-        s.connect((server_host, server_port))
+        server_address = self.server_address
+        if server_address is None:
+            server_address = (socket.gethostname(), 23457)
+        s.connect(server_address)
+
+        if not missing_ranges:
+            """
+                Add all seq data, combine to one package, send to server
+            """
+            self.send_to_server(s, self.ordered_data, "Ordered min value group")
+        else:
+            """
+                Partial aggregate, the seq data of each received range is sent as one package, so the
+            server could place the data by the package seq.
+            """
+            received_ranges = get_missing_ranges([not flag for flag in self.received_flags])
+            if not received_ranges:
+                header = send_message(message=self.get_coverage_message(), sock=s)
+                self.capture(TraceDirection.SENT, TraceRecord.SERVER_CLIENT_ID, header)
+            for i, (from_seq, to_seq) in enumerate(received_ranges):
+                self.send_to_server(s, self.ordered_data[from_seq:to_seq + 1],
+                                    self.get_coverage_message(i, len(received_ranges)), seq=from_seq)
+        s.close()
+        if self.trace is not None:
+            self.trace.close()
+            log.info(f"Traffic has been captured into {self.trace.filename}")
+
+    def send_to_server(self, sock: Socket, data, message: str, seq: int = None):
+        data_type = self.data_type if self.data_type is not None else PackageDataType.INT
+        package = Package(payload=typed_list_to_bytes(data, PackageDataType.get_dtype(data_type)),
+                          data_type=data_type)
+        package.generate_default_header()
+        package.get_header().set_message(message)
+        if seq is not None:
+            package.get_header().set_package_seq(seq)
+        send_package(package, sock)
+        self.capture(TraceDirection.SENT, TraceRecord.SERVER_CLIENT_ID, package.get_header(), package.get_payload())
 
+    def get_coverage_message(self, part_index: int = None, part_num: int = 0) -> str:
         """
-            Add all seq data, combine to one package, send to server
+            Coverage report of the partial aggregate, e.g.
+        "Partial ordered min value group | coverage: 27/30 | part 1/2"
+            There's no part if nothing has been received.
         """
-        temp_list = []
-        for seq_data in self.ordered_seq_data:
-            temp_list.append(seq_data.data)
-            # result += seq_data.data
-        # temp_list = [result]
-        package = Package(payload=int_list_to_bytes(temp_list), data_type=PackageDataType.INT)
-        package.generate_default_header()
-        package.get_header().set_message("Ordered min value group")
-        send_package(package, s)
+        message = f"Partial ordered min value group " \
+                  f"| coverage: {self.consuming_count}/{self.target_seq_data_num}"
+        if part_index is not None:
+            message += f" | part {part_index + 1}/{part_num}"
+        return message
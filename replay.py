@@ -0,0 +1,154 @@
+from threading import Thread
+import argparse
+import socket
+import time
+import os
+import tempfile
+from socket import socket as Socket
+from typing import Dict, List
+from proxy import Proxy, DeadlinePolicy
+from package import receive_package, Package, Header
+from capture import TraceReader, TraceRecord, TraceDirection
+from stand_in_server import StandInServer
+from app.utils import Logger
+
+log = Logger()
+
+
+def drain(sock: Socket, counter: Dict[str, int]):
+    """
+        Receive the ACK messages from the proxy and drop them, so that the proxy won't be blocked
+    by a full send buffer.
+    """
+    while True:
+        try:
+            result = receive_package(sock)
+        except OSError:
+            break
+        if isinstance(result, Header):
+            message = (result.get_message(parse=True) or "").rstrip('\x00')
+            counter[message] = counter.get(message, 0) + 1
+
+
+def replay(trace_file: str, speed: float = 1, target_seq_data_num: int = None, max_buffer: int = None,
+           job_deadline: float = None, deadline_policy: DeadlinePolicy = DeadlinePolicy.PARTIAL,
+           timeout: float = 60, db_file: str = None, server: StandInServer = None) -> bool:
+    """
+        Feed the frames received by the proxy in the trace back into a new proxy, each client in the
+    trace is a connection to the proxy.
+    :param trace_file:
+    :param speed:   1 for the original speed, N for N times of the original speed, 0 for as fast as possible
+    :param target_seq_data_num: None for the one of the captured job
+    :param max_buffer:  None for the one of the captured job
+    :param job_deadline:
+    :param deadline_policy:
+    :param timeout: seconds to wait for the aggregate package after all frames have been sent
+    :param db_file: database of the replayed proxy, None for a temporary one, so the results database
+                    of the proxy is not overwritten
+    :param server:  stand-in server the aggregate is sent to, None for a new one
+    :return:    True if the stand-in server has received the aggregate package
+    """
+    reader = TraceReader(trace_file)
+    metadata = reader.metadata
+    if target_seq_data_num is None:
+        target_seq_data_num = metadata.target_seq_data_num
+    elif target_seq_data_num != metadata.target_seq_data_num:
+        log.warning(f"The target seq data num of the captured job is {metadata.target_seq_data_num}, "
+                    f"but {target_seq_data_num} is used")
+    if max_buffer is None:
+        max_buffer = metadata.max_buffer
+    elif max_buffer != metadata.max_buffer:
+        log.warning(f"The max buffer of the captured job is {metadata.max_buffer}, but {max_buffer} is used")
+    log.info(f"Target seq data num: {target_seq_data_num}, max buffer: {max_buffer}")
+
+    records: List[TraceRecord] = [record for record in reader
+                                  if record.direction == TraceDirection.RECEIVED]
+    if not records:
+        log.warning(f"There's no received frame in {trace_file}")
+        return False
+    log.info(f"Replay {len(records)} frame(s) of {trace_file} at "
+             f"{'full' if speed <= 0 else f'{speed}x'} speed")
+
+    if db_file is None:
+        db_file = os.path.join(tempfile.mkdtemp(), 'result_data.db')
+    log.info(f"Replayed seq data will be stored into {db_file}")
+
+    host = socket.gethostname()
+    if server is None:
+        server = StandInServer(host)
+
+    proxy_socket = socket.socket()
+    proxy_socket.bind((host, 0))
+    proxy_socket.listen(5)
+    t = Thread(target=Proxy, daemon=True,
+               kwargs=dict(socket=proxy_socket, target_seq_data_num=target_seq_data_num, max_buffer=max_buffer,
+                           job_deadline=job_deadline, deadline_policy=deadline_policy,
+                           data_type=metadata.data_type, server_address=server.address, db_file=db_file))
+    t.start()
+
+    client_sockets: Dict[str, Socket] = {}
+    counter: Dict[str, int] = {}
+    for record in records:
+        if record.client_id not in client_sockets:
+            sock = socket.socket()
+            sock.connect(proxy_socket.getsockname())
+            client_sockets[record.client_id] = sock
+            Thread(target=drain, args=(sock, counter), daemon=True).start()
+
+    start_time = time.perf_counter()
+    first_timestamp = records[0].timestamp
+    for record in records:
+        if speed > 0:
+            delay = (record.timestamp - first_timestamp) / speed - (time.perf_counter() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            client_sockets[record.client_id].sendall(record.get_frame_data())
+        except OSError:
+            # the proxy has finished the job and closed the connection
+            break
+    send_time = time.perf_counter() - start_time
+    log.info(f"{len(records)} frame(s) sent in {send_time:.3f}s")
+
+    finished = server.received_event.wait(timeout)
+    elapsed_time = time.perf_counter() - start_time
+    for sock in client_sockets.values():
+        sock.close()
+    log.info(f"Messages from proxy: {counter}")
+    if not finished:
+        log.warning(f"The stand-in server has not received the aggregate package in {timeout}s")
+        return False
+    for result in server.results:
+        if isinstance(result, Package):
+            log.info(f"<- {result.get_desc()}")
+        else:
+            message = (result.get_message(parse=True) or "").rstrip('\x00')
+            log.info(f"<- message: \"{message}\"")
+    log.info(f"Job is done in {elapsed_time:.3f}s")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the traffic captured by main.py --capture')
+    parser.add_argument('trace_file')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='1 for the original speed, N for N times of the original speed, '
+                             '0 for as fast as possible')
+    parser.add_argument('--target', type=int, default=None,
+                        help='target seq data num of the job, default is the one of the captured job')
+    parser.add_argument('--max-buffer', type=int, default=None,
+                        help='default is the one of the captured job')
+    parser.add_argument('--deadline', type=float, default=None, help='job deadline in seconds')
+    parser.add_argument('--reassign', action='store_true',
+                        help='ask the clients to resend the missing seq when the deadline fires')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--db', default=None,
+                        help='database of the replayed seq data, default is a temporary one')
+    args = parser.parse_args()
+
+    finished = replay(args.trace_file, speed=args.speed, target_seq_data_num=args.target,
+                      max_buffer=args.max_buffer, job_deadline=args.deadline,
+                      deadline_policy=DeadlinePolicy.REASSIGN if args.reassign else DeadlinePolicy.PARTIAL,
+                      timeout=args.timeout, db_file=args.db)
+    # the threads of the proxy never end if the job is not done
+    os._exit(0 if finished else 1)
@@ -0,0 +1,34 @@
+from threading import Thread, Event
+import socket
+from socket import socket as Socket
+from typing import List
+from package import receive_package
+
+
+class StandInServer:
+    """
+        Stand-in of the upstream server, receives the aggregate from the proxy only once, which is
+    one package, or several packages and messages if the aggregate is partial.
+    """
+
+    def __init__(self, host: str):
+        self.socket: Socket = socket.socket()
+        self.socket.bind((host, 0))
+        self.socket.listen(1)
+        self.address = self.socket.getsockname()
+        self.results: List = []
+        self.received_event = Event()
+
+        t = Thread(target=self.__receive, daemon=True)
+        t.start()
+
+    def __receive(self):
+        sock, addr = self.socket.accept()
+        while True:
+            try:
+                self.results.append(receive_package(sock))
+            except OSError:
+                # the proxy closes the connection after the aggregate has been sent
+                break
+        self.received_event.set()
+        sock.close()
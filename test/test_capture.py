@@ -0,0 +1,117 @@
+from threading import Thread
+from capture import *
+from package import Header, Package, PackageDataType, send_package, receive_package
+from proxy import Proxy
+from replay import replay
+from stand_in_server import StandInServer
+from app.utils import int_list_to_bytes
+import os
+import socket
+import tempfile
+import unittest
+
+
+class CaptureTestSuite(unittest.TestCase):
+    def test_write_and_read(self):
+        header = Header()
+        header.set_message(Header.MSG_ACKNOWLEDGED)
+        filename = os.path.join(tempfile.mkdtemp(), 'test.trace')
+        writer = TraceWriter(filename, TraceMetadata(target_seq_data_num=30, max_buffer=5,
+                                                     data_type=PackageDataType.FLOAT64_LE))
+        writer.record(TraceDirection.RECEIVED, "d63038e1", header.get_header_data(), b'\x00\x01')
+        writer.record(TraceDirection.SENT, TraceRecord.SERVER_CLIENT_ID, header.get_header_data())
+        writer.close()
+
+        reader = TraceReader(filename)
+        self.assertEqual(reader.metadata.target_seq_data_num, 30)
+        self.assertEqual(reader.metadata.max_buffer, 5)
+        self.assertEqual(reader.metadata.data_type, PackageDataType.FLOAT64_LE)
+        records = list(reader)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0].direction, TraceDirection.RECEIVED)
+        self.assertEqual(records[0].client_id, "d63038e1")
+        self.assertEqual(records[0].get_frame_data(), header.get_header_data() + b'\x00\x01')
+        self.assertEqual(records[1].client_id, TraceRecord.SERVER_CLIENT_ID)
+        self.assertEqual(records[1].get_header().get_message(), header.get_message())
+        # the padding of header is not stored
+        self.assertLess(os.path.getsize(filename), 2 * Header.HEADER_LEN)
+
+    def test_not_trace_file(self):
+        filename = os.path.join(tempfile.mkdtemp(), 'test.trace')
+        with open(filename, 'wb') as f:
+            f.write(b'\x00' * 16)
+        with self.assertRaises(TraceFormatError):
+            list(TraceReader(filename))
+
+    def test_truncated(self):
+        header = Header()
+        filename = os.path.join(tempfile.mkdtemp(), 'test.trace')
+        writer = TraceWriter(filename, TraceMetadata(target_seq_data_num=30, max_buffer=5))
+        writer.record(TraceDirection.RECEIVED, "d63038e1", header.get_header_data(), b'\x00\x01')
+        writer.record(TraceDirection.RECEIVED, "d63038e1", header.get_header_data(), b'\x00\x02')
+        # the records are flushed before the writer is closed
+        with open(filename, 'rb') as f:
+            data = f.read()
+        writer.close()
+
+        for size in (len(data) - 1, len(data) - 5, len(data) - TraceRecord.RECORD_STRUCT.size - 1):
+            with open(filename, 'wb') as f:
+                f.write(data[:size])
+            reader = TraceReader(filename)
+            self.assertIsNone(reader.metadata.data_type)
+            records = list(reader)
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0].payload, b'\x00\x01')
+
+
+class CaptureReplayTestSuite(unittest.TestCase):
+    def test_capture_and_replay(self):
+        temp_dir = tempfile.mkdtemp()
+        filename = os.path.join(temp_dir, 'test.trace')
+        host = socket.gethostname()
+        server = StandInServer(host)
+        proxy_socket = socket.socket()
+        proxy_socket.bind((host, 0))
+        proxy_socket.listen(5)
+        trace = TraceWriter(filename, TraceMetadata(target_seq_data_num=6, max_buffer=10))
+        t = Thread(target=Proxy, daemon=True,
+                   kwargs=dict(socket=proxy_socket, target_seq_data_num=6, max_buffer=10,
+                               server_address=server.address, trace=trace,
+                               db_file=os.path.join(temp_dir, 'result_data.db')))
+        t.start()
+
+        clients = [socket.socket(), socket.socket()]
+        for client in clients:
+            client.connect(proxy_socket.getsockname())
+            self.addCleanup(client.close)
+        for i, (client, seq, int_list) in enumerate([(clients[0], 0, [1, 2]), (clients[1], 3, [4, 5]),
+                                                     (clients[0], 2, [3]), (clients[1], 5, [6])]):
+            package = Package(payload=int_list_to_bytes(int_list), data_type=PackageDataType.INT)
+            package.generate_default_header()
+            package.get_header().set_package_seq(seq)
+            send_package(package, client)
+            # the job might be done before the last ACK is sent
+            if i < 3:
+                self.assertIsInstance(receive_package(client), Header)
+        self.assertTrue(server.received_event.wait(10))
+        self.assertEqual(len(server.results), 1)
+
+        records = list(TraceReader(filename))
+        received = [record for record in records if record.direction == TraceDirection.RECEIVED]
+        self.assertEqual(len(received), 4)
+        self.assertEqual(len({record.client_id for record in received}), 2)
+        self.assertEqual(received[0].client_id, received[2].client_id)
+        self.assertEqual([record.get_header().get_package_seq(parse=True) for record in received], [0, 3, 2, 5])
+        sent = [record for record in records if record.direction == TraceDirection.SENT]
+        sent_to_server = [record for record in sent if record.client_id == TraceRecord.SERVER_CLIENT_ID]
+        self.assertEqual(len(sent_to_server), 1)
+        self.assertEqual(sent_to_server[0].payload, server.results[0].get_payload())
+        # ACKs to the clients
+        self.assertTrue({record.client_id for record in sent if record not in sent_to_server}
+                        <= {record.client_id for record in received})
+
+        replay_server = StandInServer(host)
+        self.assertTrue(replay(filename, speed=0, timeout=10, server=replay_server))
+        self.assertEqual(len(replay_server.results), 1)
+        self.assertEqual(replay_server.results[0].get_payload(parse=True), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(replay_server.results[0].get_payload(), server.results[0].get_payload())
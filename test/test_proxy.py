@@ -0,0 +1,118 @@
+from threading import Thread
+from proxy import Proxy, DeadlinePolicy
+from stand_in_server import StandInServer
+from package import Package, Header, PackageDataType, send_package, receive_package
+from app.utils import typed_list_to_bytes
+import os
+import socket
+import tempfile
+import unittest
+
+
+def get_message(header: Header) -> str:
+    return (header.get_message(parse=True) or "").rstrip('\x00')
+
+
+class ProxyDeadlineTestSuite(unittest.TestCase):
+    TARGET_SEQ_DATA_NUM = 6
+
+    def start_proxy(self, **kwargs) -> socket.socket:
+        """
+            Start a proxy with a stand-in server, return a client connected to the proxy.
+        """
+        host = socket.gethostname()
+        self.server = StandInServer(host)
+        proxy_socket = socket.socket()
+        proxy_socket.bind((host, 0))
+        proxy_socket.listen(5)
+        t = Thread(target=Proxy, daemon=True,
+                   kwargs=dict(socket=proxy_socket, target_seq_data_num=self.TARGET_SEQ_DATA_NUM, max_buffer=10,
+                               server_address=self.server.address,
+                               db_file=os.path.join(tempfile.mkdtemp(), 'result_data.db'), **kwargs))
+        t.start()
+        client = socket.socket()
+        client.connect(proxy_socket.getsockname())
+        self.addCleanup(client.close)
+        return client
+
+    @staticmethod
+    def send_seq_data(client: socket.socket, seq: int, values, wait_reply: bool = True,
+                      data_type: PackageDataType = PackageDataType.INT) -> str:
+        package = Package(payload=typed_list_to_bytes(values, PackageDataType.get_dtype(data_type)),
+                          data_type=data_type)
+        package.generate_default_header()
+        package.get_header().set_package_seq(seq)
+        send_package(package, client)
+        if wait_reply:
+            return get_message(receive_package(client))
+
+    def wait_server(self):
+        self.assertTrue(self.server.received_event.wait(10))
+        return self.server.results
+
+    def test_partial(self):
+        client = self.start_proxy(job_deadline=0.5)
+        self.assertEqual(self.send_seq_data(client, 0, [1, 2]), Header.MSG_ACKNOWLEDGED)
+        self.assertEqual(self.send_seq_data(client, 4, [5]), Header.MSG_ACKNOWLEDGED)
+        # duplicated and out of range seq data are ignored
+        self.assertEqual(self.send_seq_data(client, 1, [9]), Header.MSG_ACKNOWLEDGED)
+        self.assertEqual(self.send_seq_data(client, 10, [7]), Header.MSG_ACKNOWLEDGED)
+
+        results = self.wait_server()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].get_header().get_package_seq(parse=True), 0)
+        self.assertEqual(results[0].get_payload(parse=True), [1, 2])
+        self.assertEqual(get_message(results[0].get_header()),
+                         "Partial ordered min value group | coverage: 3/6 | part 1/2")
+        self.assertEqual(results[1].get_header().get_package_seq(parse=True), 4)
+        self.assertEqual(results[1].get_payload(parse=True), [5])
+
+    def test_partial_nothing_received(self):
+        self.start_proxy(job_deadline=0.2)
+        results = self.wait_server()
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0], Header)
+        self.assertEqual(get_message(results[0]), "Partial ordered min value group | coverage: 0/6")
+
+    def test_reassign(self):
+        client = self.start_proxy(job_deadline=0.5, deadline_policy=DeadlinePolicy.REASSIGN, reassign_timeout=0.5)
+        self.assertEqual(self.send_seq_data(client, 0, [1, 2]), Header.MSG_ACKNOWLEDGED)
+        self.assertEqual(get_message(receive_package(client)), f"{Header.MSG_REQUEST_SEQ_RANGE}: 2-5")
+        self.assertEqual(self.send_seq_data(client, 2, [3, 4]), Header.MSG_ACKNOWLEDGED)
+
+        # seq 4 and 5 are still missing after the reassign timeout
+        results = self.wait_server()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].get_header().get_package_seq(parse=True), 0)
+        self.assertEqual(results[0].get_payload(parse=True), [1, 2, 3, 4])
+        self.assertEqual(get_message(results[0].get_header()),
+                         "Partial ordered min value group | coverage: 4/6 | part 1/1")
+
+    def test_reassign_fulfilled(self):
+        client = self.start_proxy(job_deadline=0.5, deadline_policy=DeadlinePolicy.REASSIGN, reassign_timeout=5)
+        self.assertEqual(self.send_seq_data(client, 0, [1, 2, 3]), Header.MSG_ACKNOWLEDGED)
+        self.assertEqual(get_message(receive_package(client)), f"{Header.MSG_REQUEST_SEQ_RANGE}: 3-5")
+        # the job might be done before the ACK is sent
+        self.send_seq_data(client, 3, [4, 5, 6], wait_reply=False)
+
+        results = self.wait_server()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].get_payload(parse=True), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(get_message(results[0].get_header()), "Ordered min value group")
+
+    def test_typed_seq_data(self):
+        client = self.start_proxy()
+        float64_le = PackageDataType.FLOAT64_LE
+        self.assertEqual(self.send_seq_data(client, 0, [0.5, 1.5, 2.5], data_type=float64_le),
+                         Header.MSG_ACKNOWLEDGED)
+        self.assertEqual(self.send_seq_data(client, 1, [7, 8], data_type=PackageDataType.INT32),
+                         Header.MSG_UNSUPPORTED_DATA_TYPE)
+        # seq 2 has been received, only seq 3 is stored
+        self.assertEqual(self.send_seq_data(client, 2, [9.0, 3.5], data_type=float64_le),
+                         Header.MSG_ACKNOWLEDGED)
+        self.send_seq_data(client, 4, [4.5, 5.5], wait_reply=False, data_type=float64_le)
+
+        results = self.wait_server()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].get_data_type(), float64_le)
+        self.assertEqual(results[0].get_payload(parse=True).tolist(), [0.5, 1.5, 2.5, 3.5, 4.5, 5.5])
@@ -1,6 +1,11 @@
 from app.utils import *
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class UtilsTestSuite(unittest.TestCase):
     def test_bytes2int(self):
@@ -8,3 +13,39 @@ class UtilsTestSuite(unittest.TestCase):
         c = bytes2int(b)
         self.assertEqual(type(c), int)
 
+    def test_get_missing_ranges(self):
+        received = [True, False, False, True, True, False, True, False]
+        self.assertEqual(get_missing_ranges(received), [(1, 2), (5, 5), (7, 7)])
+        self.assertEqual(get_missing_ranges([True, True]), [])
+
+    def test_ranges_str(self):
+        ranges = [(1, 2), (5, 5), (7, 10)]
+        self.assertEqual(ranges_to_str(ranges), "1-2,5,7-10")
+
+    def test_typed_array(self):
+        values = [1.5, -2.25, 3.0]
+        for dtype in ('<f8', '>f8'):
+            _bytes = typed_list_to_bytes(values, dtype)
+            self.assertEqual(len(_bytes), 24)
+            self.assertEqual(list(bytes_to_typed_array(_bytes, dtype)), values)
+        self.assertEqual(typed_list_to_bytes([1, -2], '<i4'), b'\x01\x00\x00\x00\xfe\xff\xff\xff')
+        self.assertEqual(list(bytes_to_typed_array(int_list_to_bytes([7, -8]), '>i8')), [7, -8])
+        with self.assertRaises(ValueError):
+            bytes_to_typed_array(b'\x00' * 6, '<i4')
+
+    def test_new_typed_array(self):
+        result = new_typed_array('>f8', 3)
+        self.assertEqual(list(result), [0.0, 0.0, 0.0])
+        result[1:3] = bytes_to_typed_array(typed_list_to_bytes([1.5, 2.5], '>f8'), '>f8')
+        self.assertEqual(bytes_to_typed_array(typed_list_to_bytes(result, '>f8'), '>f8').tolist(), [0.0, 1.5, 2.5])
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_typed_array_numpy(self):
+        _bytes = typed_list_to_bytes([1, 2, 3], '<i4')
+        result = bytes_to_typed_array(_bytes, '<i4', use_numpy=True)
+        self.assertEqual(result.tolist(), [1, 2, 3])
+        self.assertEqual(typed_list_to_bytes(result, '>i4'), typed_list_to_bytes([1, 2, 3], '>i4'))
+        result = bytes_to_typed_array(typed_list_to_bytes([1.5, -2.5], '>f8'), '>f8', use_numpy=True)
+        self.assertEqual(result.dtype, numpy.dtype('>f8'))
+        self.assertEqual(result.tolist(), [1.5, -2.5])
+        self.assertEqual(typed_list_to_bytes(numpy.array([1.5, -2.5]), '<f8'), typed_list_to_bytes([1.5, -2.5], '<f8'))